@@ -9,25 +9,45 @@ License: MIT
 
 import os
 import mmap
-import struct
 import json
 import time
 import logging
 import requests
 import numpy as np
+from numba import njit
 from datetime import datetime
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
-from flask import Flask, jsonify
+from typing import Dict, List, Tuple
+from flask import Flask, Response
+import orjson
+from waitress import serve
 import threading
+from functools import lru_cache
 
 # Configuration
 PROC_PATH = "/proc/optifiber/myinfo"
-BUFFER_SIZE = 4 * 4096  # 4 pages
 NUM_SITES = 4
 SITE_STRUCT_SIZE = 96  # Size of site_stats struct
+# Map only the pages that hold site records
+BUFFER_SIZE = -(-NUM_SITES * SITE_STRUCT_SIZE // mmap.PAGESIZE) * mmap.PAGESIZE
 UPDATE_INTERVAL = 1.0  # seconds
 API_PORT = 8080
+HISTORY_SIZE = 60  # samples kept per site (1 minute at 1s intervals)
+ANOMALY_WINDOW = 10  # samples used for z-score anomaly detection
+FORECAST_WINDOW = 5  # samples used for trend forecasting
+FORECAST_HORIZON = 900  # seconds (15 minutes)
+
+# NumPy record layout of struct site_stats (site_name, timestamp, throughput,
+# error_count, ber_errors, link_status, utilization), strided at SITE_STRUCT_SIZE
+_SITE_DTYPE = np.dtype({
+    'names': ['name', 'timestamp', 'throughput', 'errors', 'ber', 'link', 'util'],
+    'formats': ['S32', '<u8', '<u4', '<u4', '<u4', '<u4', '<f4'],
+    'offsets': [0, 32, 40, 44, 48, 52, 56],
+    'itemsize': SITE_STRUCT_SIZE
+})
+
+# Centered sample positions for the closed-form least-squares trend slope
+_LR_X = np.arange(FORECAST_WINDOW) - (FORECAST_WINDOW - 1) / 2.0
+_LR_DENOM = float((_LR_X ** 2).sum())
 
 # Setup logging
 logging.basicConfig(
@@ -36,18 +56,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger('skma-fon-agent')
 
-@dataclass
-class SiteMetrics:
-    """Site metrics data structure"""
-    site_name: str
-    timestamp: int
-    throughput_gbps: int
-    error_count: int
-    ber_errors: int
-    link_status: int
-    utilization: float
-    anomaly_score: float = 0.0
-    forecast_gbps: int = 0
+@lru_cache(maxsize=64)
+def _site_name(raw_name: bytes) -> str:
+    """Decode a kernel site name (names are stable, so decode each once)"""
+    return raw_name.rstrip(b'\x00').decode('utf-8')
+
+def _json(payload) -> Response:
+    """Serialize a payload to a JSON response with orjson"""
+    return Response(orjson.dumps(payload), mimetype='application/json')
 
 class KernelDataReader:
     """Handles reading data from kernel module via mmap"""
@@ -56,6 +72,7 @@ class KernelDataReader:
         self.proc_path = proc_path
         self.fd = None
         self.mapped_buffer = None
+        self._mv = None  # Zero-copy view over mapped_buffer
         
     def __enter__(self):
         self.connect()
@@ -69,6 +86,12 @@ class KernelDataReader:
         try:
             self.fd = os.open(self.proc_path, os.O_RDWR)
             self.mapped_buffer = mmap.mmap(self.fd, BUFFER_SIZE)
+            try:
+                # The records are read every tick, keep them resident
+                self.mapped_buffer.madvise(mmap.MADV_WILLNEED)
+            except OSError as e:
+                logger.debug(f"madvise not supported on {self.proc_path}: {e}")
+            self._mv = memoryview(self.mapped_buffer)
             logger.info(f"Connected to kernel module via {self.proc_path}")
         except Exception as e:
             logger.error(f"Failed to connect to kernel module: {e}")
@@ -76,130 +99,104 @@ class KernelDataReader:
             
     def disconnect(self):
         """Disconnect from kernel module"""
+        if self._mv is not None:
+            self._mv.release()
+            self._mv = None
         if self.mapped_buffer:
             self.mapped_buffer.close()
         if self.fd:
             os.close(self.fd)
         logger.info("Disconnected from kernel module")
         
-    def read_site_data(self, site_idx: int) -> Optional[SiteMetrics]:
-        """Read data for a specific site from shared memory"""
+    def read_all_sites(self) -> np.ndarray:
+        """Read data for all sites as a _SITE_DTYPE record array"""
         if not self.mapped_buffer:
-            return None
+            return np.empty(0, dtype=_SITE_DTYPE)
             
         try:
-            offset = site_idx * SITE_STRUCT_SIZE
-            self.mapped_buffer.seek(offset)
-            
-            # Read struct data (matches kernel struct site_stats)
-            raw_data = self.mapped_buffer.read(SITE_STRUCT_SIZE)
-            
-            # Unpack the structure
-            # Format: 32s Q I I I I f 8I (site_name, timestamp, throughput, error_count, 
-            #         ber_errors, link_status, utilization, reserved[8])
-            unpacked = struct.unpack('32s Q I I I I f 8I', raw_data)
-            
-            site_name = unpacked[0].decode('utf-8').rstrip('\x00')
-            timestamp = unpacked[1]
-            throughput_gbps = unpacked[2]
-            error_count = unpacked[3]
-            ber_errors = unpacked[4]
-            link_status = unpacked[5]
-            utilization = unpacked[6]
-            
-            return SiteMetrics(
-                site_name=site_name,
-                timestamp=timestamp,
-                throughput_gbps=throughput_gbps,
-                error_count=error_count,
-                ber_errors=ber_errors,
-                link_status=link_status,
-                utilization=utilization
-            )
-            
+            # Parse every record in one call, then snapshot it since the
+            # kernel keeps updating the mapping
+            return np.frombuffer(self._mv, dtype=_SITE_DTYPE, count=NUM_SITES).copy()
         except Exception as e:
-            logger.error(f"Error reading site {site_idx} data: {e}")
-            return None
-            
-    def read_all_sites(self) -> List[SiteMetrics]:
-        """Read data for all sites"""
-        sites = []
-        for i in range(NUM_SITES):
-            site_data = self.read_site_data(i)
-            if site_data:
-                sites.append(site_data)
-        return sites
+            logger.error(f"Error reading site data: {e}")
+            return np.empty(0, dtype=_SITE_DTYPE)
 
-class AIInferenceEngine:
-    """Simple AI inference for anomaly detection and forecasting"""
+@njit(cache=True)
+def _ai_pass(thr, head, count, errors, anomaly_out, forecast_out):
+    """Fused z-score anomaly detection and trend forecast over the ring buffers"""
+    size = thr.shape[1]
+    steps = FORECAST_HORIZON / UPDATE_INTERVAL
     
-    def __init__(self):
-        self.history = {}  # Store historical data for each site
+    for s in range(thr.shape[0]):
+        h = head[s] + size  # keeps (h - k) % size non-negative
+        current = float(thr[s, (h - 1) % size])
         
-    def update_history(self, site_metrics: SiteMetrics):
-        """Update historical data for a site"""
-        site_name = site_metrics.site_name
-        if site_name not in self.history:
-            self.history[site_name] = []
-            
-        self.history[site_name].append({
-            'timestamp': site_metrics.timestamp,
-            'throughput': site_metrics.throughput_gbps,
-            'errors': site_metrics.error_count,
-            'utilization': site_metrics.utilization
-        })
+        # Anomaly detection: mean and variance from one pass over the window
+        total = 0.0
+        sq_total = 0.0
+        for j in range(ANOMALY_WINDOW):
+            x = float(thr[s, (h - ANOMALY_WINDOW + j) % size])
+            total += x
+            sq_total += x * x
+        mean = total / ANOMALY_WINDOW
+        var = sq_total / ANOMALY_WINDOW - mean * mean
         
-        # Keep only last 60 data points (1 minute at 1s intervals)
-        if len(self.history[site_name]) > 60:
-            self.history[site_name] = self.history[site_name][-60:]
-            
-    def detect_anomaly(self, site_metrics: SiteMetrics) -> float:
-        """Simple anomaly detection based on statistical thresholds"""
-        site_name = site_metrics.site_name
+        score = 0.0
+        if count[s] >= ANOMALY_WINDOW and var > 0.0:
+            score = min(abs(current - mean) / np.sqrt(var) / 3.0, 1.0)  # 3-sigma rule
+            if errors[s] > 10:  # Error spike
+                score = max(score, 0.8)
+        anomaly_out[s] = score
         
-        if site_name not in self.history or len(self.history[site_name]) < 10:
-            return 0.0
-            
-        # Get recent throughput values
-        recent_throughput = [d['throughput'] for d in self.history[site_name][-10:]]
-        mean_throughput = np.mean(recent_throughput)
-        std_throughput = np.std(recent_throughput)
-        
-        if std_throughput == 0:
-            return 0.0
-            
-        # Calculate z-score
-        z_score = abs(site_metrics.throughput_gbps - mean_throughput) / std_throughput
+        # Forecasting: least-squares linear trend over the recent window
+        # (samples are UPDATE_INTERVAL apart, so the slope is per sample)
+        if count[s] >= FORECAST_WINDOW:
+            num = 0.0
+            for j in range(FORECAST_WINDOW):
+                num += _LR_X[j] * float(thr[s, (h - FORECAST_WINDOW + j) % size])
+            forecast_out[s] = np.int64(max(np.trunc(current + num / _LR_DENOM * steps), 0.0))
+        else:
+            forecast_out[s] = np.int64(current)
+
+class AIInferenceEngine:
+    """Simple AI inference for anomaly detection and forecasting"""
+    
+    def __init__(self):
+        # Structure-of-arrays ring buffers, one row per site; throughput keeps
+        # the kernel's u32 width and is widened to float64 inside the AI pass
+        self.thr = np.zeros((NUM_SITES, HISTORY_SIZE), dtype=np.uint32)
+        self.head = np.zeros(NUM_SITES, dtype=np.int32)
+        self.count = np.zeros(NUM_SITES, dtype=np.int32)
         
-        # Convert to anomaly score (0-1)
-        anomaly_score = min(z_score / 3.0, 1.0)  # 3-sigma rule
+        # Compile the kernel now rather than on the first monitoring tick
+        self.process_all(np.zeros(0, dtype=_SITE_DTYPE))
         
-        # Check for error spikes
-        if site_metrics.error_count > 10:
-            anomaly_score = max(anomaly_score, 0.8)
-            
-        return anomaly_score
+    def update_history(self, throughput: np.ndarray):
+        """Append one sample per site to the history (rows follow kernel site order)"""
+        n = len(throughput)
+        head = self.head[:n]
+        count = self.count[:n]
         
-    def forecast_traffic(self, site_metrics: SiteMetrics) -> int:
-        """Simple traffic forecasting using linear trend"""
-        site_name = site_metrics.site_name
+        self.thr[np.arange(n), head] = throughput
+        np.add(head, 1, out=head)
+        np.remainder(head, HISTORY_SIZE, out=head)
+        np.minimum(count + 1, HISTORY_SIZE, out=count)
         
-        if site_name not in self.history or len(self.history[site_name]) < 5:
-            return site_metrics.throughput_gbps
-            
-        # Get recent throughput values
-        recent_data = self.history[site_name][-5:]
-        throughputs = [d['throughput'] for d in recent_data]
-        timestamps = [d['timestamp'] for d in recent_data]
+    def process_all(self, raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Update history and run anomaly detection and forecasting for all sites"""
+        n = len(raw)
+        self.update_history(raw['throughput'])
         
-        # Simple linear regression
-        if len(set(timestamps)) > 1:  # Avoid division by zero
-            slope = (throughputs[-1] - throughputs[0]) / (timestamps[-1] - timestamps[0])
-            # Forecast 15 minutes ahead (900 seconds)
-            forecast = int(throughputs[-1] + slope * 900)
-            return max(0, forecast)  # Ensure non-negative
+        anomaly_scores = np.empty(n, dtype=np.float64)
+        forecasts = np.empty(n, dtype=np.int64)
+        # The errors field is a strided view; a contiguous copy keeps the call on
+        # the same 'C'-layout specialization the constructor compiled
+        _ai_pass(
+            self.thr[:n], self.head[:n], self.count[:n], np.ascontiguousarray(raw['errors']),
+            anomaly_scores, forecasts
+        )
         
-        return site_metrics.throughput_gbps
+        return anomaly_scores, forecasts
 
 class MonitoringAgent:
     """Main monitoring agent"""
@@ -208,7 +205,15 @@ class MonitoringAgent:
         self.running = False
         self.data_reader = None
         self.ai_engine = AIInferenceEngine()
-        self.latest_metrics = []
+        # Latest tick state: raw site records plus anomaly scores and forecasts
+        self.state = {
+            'raw': np.empty(0, dtype=_SITE_DTYPE),
+            'anom': np.zeros(0),
+            'fcst': np.zeros(0, dtype=np.int64)
+        }
+        # Encoded (metrics, anomalies, site count) swapped as one immutable tuple
+        self._snapshot_lock = threading.Lock()
+        self.publish_state(self.state)
         self.flask_app = Flask(__name__)
         self.setup_flask_routes()
         
@@ -217,68 +222,102 @@ class MonitoringAgent:
         @self.flask_app.route('/metrics')
         def get_metrics():
             """Return latest metrics as JSON"""
-            return jsonify({
-                'timestamp': int(time.time()),
-                'sites': [asdict(metric) for metric in self.latest_metrics]
-            })
+            return Response(self.snapshot()[0], mimetype='application/json')
             
         @self.flask_app.route('/health')
         def health_check():
             """Health check endpoint"""
-            return jsonify({
+            return _json({
                 'status': 'healthy',
                 'agent_running': self.running,
-                'sites_monitored': len(self.latest_metrics)
+                'sites_monitored': self.snapshot()[2]
             })
             
         @self.flask_app.route('/anomalies')
         def get_anomalies():
             """Return sites with high anomaly scores"""
-            anomalous_sites = [
-                asdict(metric) for metric in self.latest_metrics 
-                if metric.anomaly_score >= 0.8
-            ]
-            return jsonify({
-                'timestamp': int(time.time()),
-                'anomalous_sites': anomalous_sites,
-                'count': len(anomalous_sites)
-            })
-            
-    def process_metrics(self, raw_metrics: List[SiteMetrics]) -> List[SiteMetrics]:
-        """Process raw metrics with AI inference"""
-        processed_metrics = []
-        
-        for metric in raw_metrics:
-            # Update historical data
-            self.ai_engine.update_history(metric)
-            
-            # Run AI inference
-            metric.anomaly_score = self.ai_engine.detect_anomaly(metric)
-            metric.forecast_gbps = self.ai_engine.forecast_traffic(metric)
+            return Response(self.snapshot()[1], mimetype='application/json')
             
-            processed_metrics.append(metric)
+    def snapshot(self) -> Tuple[bytes, bytes, int]:
+        """Return the latest published (metrics, anomalies, site count) snapshot"""
+        with self._snapshot_lock:
+            return self._snapshot
             
-        return processed_metrics
+    def process_metrics(self, raw: np.ndarray) -> Dict[str, np.ndarray]:
+        """Process raw site records with AI inference"""
+        # Run AI inference for all sites in a single pass
+        anomaly_scores, forecasts = self.ai_engine.process_all(raw)
+        
+        return {'raw': raw, 'anom': anomaly_scores, 'fcst': forecasts}
+        
+    @staticmethod
+    def _site_dicts(state: Dict[str, np.ndarray]) -> List[Dict]:
+        """Build JSON-ready site dicts from a tick state"""
+        raw = state['raw']
+        return [
+            {
+                'site_name': _site_name(name),
+                'timestamp': timestamp,
+                'throughput_gbps': throughput_gbps,
+                'error_count': error_count,
+                'ber_errors': ber_errors,
+                'link_status': link_status,
+                'utilization': utilization,
+                'anomaly_score': anomaly_score,
+                'forecast_gbps': forecast_gbps
+            }
+            for (name, timestamp, throughput_gbps, error_count, ber_errors,
+                 link_status, utilization, anomaly_score, forecast_gbps) in zip(
+                raw['name'].tolist(), raw['timestamp'].tolist(),
+                raw['throughput'].tolist(), raw['errors'].tolist(),
+                raw['ber'].tolist(), raw['link'].tolist(), raw['util'].tolist(),
+                state['anom'].tolist(), state['fcst'].tolist()
+            )
+        ]
+        
+    def publish_state(self, state: Dict[str, np.ndarray]) -> List[Dict]:
+        """Publish a tick state, encoding the API responses once per tick"""
+        timestamp = int(time.time())
+        sites = self._site_dicts(state)
+        hits = np.flatnonzero(state['anom'] >= 0.8)
+        anomalous_sites = [sites[i] for i in hits.tolist()]
+        
+        metrics_json = orjson.dumps({
+            'timestamp': timestamp,
+            'sites': sites
+        })
+        anomalies_json = orjson.dumps({
+            'timestamp': timestamp,
+            'anomalous_sites': anomalous_sites,
+            'count': len(anomalous_sites)
+        })
+        
+        # Swap state and encoded responses together so readers never see a mix
+        with self._snapshot_lock:
+            self.state = state
+            self._snapshot = (metrics_json, anomalies_json, len(sites))
+        
+        return sites
         
-    def send_to_cloud(self, metrics: List[SiteMetrics]):
+    def send_to_cloud(self, sites: List[Dict]):
         """Send metrics to cloud (placeholder)"""
         # In a real implementation, this would send to InfluxDB Cloud
         try:
             payload = {
                 'timestamp': int(time.time()),
-                'metrics': [asdict(metric) for metric in metrics]
+                'metrics': sites
             }
             
             # For MVP, just log the data that would be sent
-            logger.info(f"Would send to cloud: {len(metrics)} site metrics")
+            logger.info(f"Would send to cloud: {len(sites)} site metrics")
             
             # Check for high anomaly scores or utilization
-            for metric in metrics:
-                if metric.anomaly_score >= 0.8:
-                    logger.warning(f"ANOMALY DETECTED: {metric.site_name} - Score: {metric.anomaly_score:.2f}")
+            for metric in sites:
+                if metric['anomaly_score'] >= 0.8:
+                    logger.warning(f"ANOMALY DETECTED: {metric['site_name']} - Score: {metric['anomaly_score']:.2f}")
                     
-                if metric.utilization >= 90.0:
-                    logger.warning(f"HIGH UTILIZATION: {metric.site_name} - {metric.utilization:.1f}%")
+                if metric['utilization'] >= 90.0:
+                    logger.warning(f"HIGH UTILIZATION: {metric['site_name']} - {metric['utilization']:.1f}%")
                     
         except Exception as e:
             logger.error(f"Error sending to cloud: {e}")
@@ -294,20 +333,20 @@ class MonitoringAgent:
                 while self.running:
                     try:
                         # Read raw data from kernel
-                        raw_metrics = reader.read_all_sites()
+                        raw = reader.read_all_sites()
                         
-                        if raw_metrics:
+                        if raw.size:
                             # Process with AI
-                            processed_metrics = self.process_metrics(raw_metrics)
+                            state = self.process_metrics(raw)
                             
-                            # Update latest metrics
-                            self.latest_metrics = processed_metrics
+                            # Update latest metrics and cached responses
+                            sites = self.publish_state(state)
                             
                             # Send to cloud
-                            self.send_to_cloud(processed_metrics)
+                            self.send_to_cloud(sites)
                             
                             # Log summary
-                            logger.info(f"Processed {len(processed_metrics)} sites")
+                            logger.info(f"Processed {len(raw)} sites")
                             
                         time.sleep(UPDATE_INTERVAL)
                         
@@ -330,7 +369,7 @@ class MonitoringAgent:
         
         # Start Flask API
         logger.info(f"Starting API server on port {API_PORT}")
-        self.flask_app.run(host='0.0.0.0', port=API_PORT, debug=False)
+        serve(self.flask_app, host='0.0.0.0', port=API_PORT, threads=4, _quiet=True)
         
     def stop(self):
         """Stop the monitoring agent"""
@@ -8,20 +8,129 @@ License: MIT
 """
 
 import numpy as np
-import pandas as pd
+from numba import njit, prange
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+import onnxruntime as ort
 import joblib
 import logging
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 import json
 import os
+import shutil
+import time
 from datetime import datetime, timedelta
 
 logger = logging.getLogger('skma-fon-ai')
 
+# Closed-form least-squares slope weights for x = arange(5)
+_SLOPE_WEIGHTS_5 = np.array([-2, -1, 0, 1, 2], dtype=np.float64)
+_SLOPE_DEN_5 = 10.0
+
+@njit(cache=True, nogil=True)
+def _one_pass_stats(y):
+    """Return (mean, sample std, least-squares slope against the index) of y"""
+    n = y.size
+    
+    # Single sweep accumulating sum(d), sum(d^2) and sum(i * d), with d shifted
+    # by the first sample so a constant series has exactly zero variance
+    shift = float(y[0])
+    s = 0.0
+    ss = 0.0
+    sxy = 0.0
+    for i in range(n):
+        d = float(y[i]) - shift
+        s += d
+        ss += d * d
+        sxy += i * d
+    mean = shift + s / n
+    if n < 2:
+        return mean, np.nan, 0.0
+    var = max((ss - s * s / n) / (n - 1), 0.0)
+    slope = (sxy - (n - 1) / 2.0 * s) / (n * (n * n - 1) / 12.0)
+    return mean, np.sqrt(var), slope
+
+@njit(cache=True, nogil=True)
+def _zscore_score(y, recent):
+    """Score the mean of the last `recent` samples against the earlier ones"""
+    split = y.size - recent
+    historical_mean, historical_std, _ = _one_pass_stats(y[:split])
+    if historical_std == 0:
+        return 0.0
+    z_score = abs(y[split:].mean() - historical_mean) / historical_std
+    return min(z_score / 3.0, 1.0)  # 3-sigma rule
+
+@njit(cache=True, nogil=True)
+def _trend_forecast(recent, steps):
+    """Extrapolate the last five samples linearly by `steps` samples"""
+    num = 0.0
+    for j in range(5):
+        num += _SLOPE_WEIGHTS_5[j] * recent[j]
+    return float(recent[4]) + num / _SLOPE_DEN_5 * steps
+
+@njit(cache=True, nogil=True, parallel=True)
+def _score_batch(X, feature, threshold, left, right, path_len, norm, offset, out):
+    """IsolationForest decision_function over frozen tree arrays, one row per site"""
+    for i in prange(X.shape[0]):
+        depth = 0.0
+        for t in range(feature.shape[0]):
+            node = 0
+            while left[t, node] != -1:
+                if X[i, feature[t, node]] <= threshold[t, node]:
+                    node = left[t, node]
+                else:
+                    node = right[t, node]
+            depth += path_len[t, node]
+        out[i] = -(2.0 ** (-depth / norm)) - offset
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average unsuccessful-search path length of a BST with n samples"""
+    n = np.asarray(n_samples, dtype=np.float64)
+    apl = np.zeros_like(n)
+    apl[n == 2] = 1.0
+    big = n > 2
+    apl[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return apl
+
+def _ensure_warm():
+    """Compile the numeric kernels now rather than on the first tick"""
+    y = np.zeros(10, dtype=np.float32)
+    _one_pass_stats(y)
+    _zscore_score(y, 5)
+    _trend_forecast(y[-5:], 900)
+    
+    # Single-leaf forest
+    nodes_i = np.full((1, 1), -1, dtype=np.int32)
+    nodes_f = np.zeros((1, 1), dtype=np.float64)
+    _score_batch(np.zeros((1, 8), dtype=np.float32), nodes_i, nodes_f, nodes_i,
+                 nodes_i, nodes_f, 1.0, 0.0, np.empty(1, dtype=np.float64))
+    
+    # Read-only variant used with memory-mapped trees
+    nodes_i.setflags(write=False)
+    nodes_f.setflags(write=False)
+    _score_batch(np.zeros((1, 8), dtype=np.float32), nodes_i, nodes_f, nodes_i,
+                 nodes_i, nodes_f, 1.0, 0.0, np.empty(1, dtype=np.float64))
+
+# Opsets for the exported IsolationForest (TreeEnsemble ops need ai.onnx.ml 3)
+_ONNX_OPSET = {'': 15, 'ai.onnx.ml': 3}
+
+# Frozen per-tree arrays, in _score_batch argument order; each is stored as
+# <field>.npy so it can be memory-mapped, with (norm, offset) in params.npy
+_TREE_FIELDS = ('feature', 'threshold', 'left', 'right', 'path_len')
+
+def _model_paths(filepath: str) -> Tuple[str, str, str]:
+    """Return the ONNX model, scaler and frozen tree directory next to a joblib model"""
+    base = os.path.splitext(filepath)[0]
+    return base + '.onnx', base + '_scaler.npz', base + '_trees'
+
+def _time_features() -> Tuple[float, int]:
+    """Return (time_of_day, day_of_week) for the current local time"""
+    now = datetime.now()
+    return now.hour + now.minute / 60.0, now.weekday()  # 0-24, 0-6
+
 @dataclass
 class NetworkFeatures:
     """Network features for AI inference"""
@@ -34,6 +143,63 @@ class NetworkFeatures:
     time_of_day: float
     day_of_week: float
 
+class SiteHistory:
+    """Fixed-capacity ring buffer of site metrics, one array per field"""
+    
+    def __init__(self, capacity: int = 24 * 60 * 60):
+        self.capacity = capacity
+        # Metrics are stored as float32/int32; the kernels accumulate in float64
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.throughput = np.empty(capacity, dtype=np.float32)
+        self.errors = np.empty(capacity, dtype=np.int32)
+        self.utilization = np.empty(capacity, dtype=np.float32)
+        self.head = 0  # next write position
+        self.len = 0
+        self.version = 0  # bumped on every append, keys cached inference results
+        
+    def __len__(self) -> int:
+        return self.len
+        
+    def append(self, timestamp: int, throughput: float, errors: int, utilization: float):
+        """Append one sample, overwriting the oldest once full"""
+        i = self.head
+        self.timestamp[i] = timestamp
+        self.throughput[i] = throughput
+        self.errors[i] = errors
+        self.utilization[i] = utilization
+        self.head = (i + 1) % self.capacity
+        self.len = min(self.len + 1, self.capacity)
+        self.version += 1
+        
+    def extend(self, timestamp: np.ndarray, throughput: np.ndarray,
+               errors: np.ndarray, utilization: np.ndarray):
+        """Append a block of samples, wrapping around the buffer end at most once"""
+        n = min(len(throughput), self.capacity)
+        if n == 0:
+            return
+            
+        first = min(n, self.capacity - self.head)
+        for buf, values in ((self.timestamp, timestamp), (self.throughput, throughput),
+                            (self.errors, errors), (self.utilization, utilization)):
+            values = np.asarray(values)[-n:]
+            np.copyto(buf[self.head:self.head + first], values[:first])
+            np.copyto(buf[:n - first], values[first:])
+            
+        self.head = (self.head + n) % self.capacity
+        self.len = min(self.len + n, self.capacity)
+        self.version += 1
+        
+    def tail(self, field: str, n: Optional[int] = None) -> np.ndarray:
+        """Return the last n samples of a field, oldest first (a view unless wrapped)"""
+        buf = getattr(self, field)
+        n = self.len if n is None else min(n, self.len)
+        start = self.head - n
+        if start >= 0:
+            return buf[start:self.head]
+        if self.head == 0:
+            return buf[start:]
+        return np.concatenate((buf[start:], buf[:self.head]))
+
 class AnomalyDetector:
     """Isolation Forest-based anomaly detection"""
     
@@ -41,51 +207,126 @@ class AnomalyDetector:
         self.model = IsolationForest(
             contamination=contamination,
             random_state=42,
-            n_estimators=100
+            n_estimators=100,
+            max_samples='auto',  # min(256, n_samples) per tree
+            n_jobs=-1,
+            bootstrap=False
         )
         self.scaler = StandardScaler()
         self.is_trained = False
         
-    def extract_features(self, metrics_history: List[Dict]) -> NetworkFeatures:
+        # Set by train(); the fast load path leaves model/scaler unfitted, so only
+        # a model retrained in this process is written back out
+        self._unsaved = False
+        
+        # Reused feature row and cached scaler statistics for predict()
+        self._feat_buf = np.empty((1, 8), dtype=np.float32)
+        self._mean = None
+        self._scale = None
+        
+        # Serialized ONNX forest and its onnxruntime session, used for scoring
+        # only when the forest can't be frozen into _trees
+        self._onnx_bytes = None
+        self._ort_session = None
+        
+        # Flattened tree arrays plus (norm, offset) for the Numba scorer
+        self._trees = None
+        
+    def _cache_scaler(self):
+        """Cache the fitted scaler statistics for in-place scaling"""
+        self._mean = self.scaler.mean_.astype(np.float64)
+        self._scale = self.scaler.scale_.astype(np.float64)
+        
+    def _load_session(self, onnx_bytes: bytes):
+        """Create the onnxruntime session that scores feature rows"""
+        self._onnx_bytes = onnx_bytes
+        self._ort_session = ort.InferenceSession(
+            onnx_bytes, providers=['CPUExecutionProvider']
+        )
+        
+    def _freeze_trees(self):
+        """Flatten the fitted forest into padded per-tree arrays for _score_batch"""
+        estimators = self.model.estimators_
+        n_trees = len(estimators)
+        max_nodes = max(est.tree_.node_count for est in estimators)
+        
+        feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+        left = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        right = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        path_len = np.zeros((n_trees, max_nodes), dtype=np.float64)
+        
+        for t, (est, est_features) in enumerate(zip(estimators, self.model.estimators_features_)):
+            tree = est.tree_
+            n = tree.node_count
+            
+            # Trees fit on a feature subset index into that subset
+            tree_feature = np.maximum(tree.feature, 0)
+            if len(est_features) != self.model.n_features_in_:
+                tree_feature = np.asarray(est_features)[tree_feature]
+            feature[t, :n] = tree_feature
+            threshold[t, :n] = tree.threshold
+            left[t, :n] = tree.children_left
+            right[t, :n] = tree.children_right
+            
+            # Node depths (children always follow their parent in node order)
+            depth = np.zeros(n, dtype=np.float64)
+            for node in range(n):
+                if tree.children_left[node] != -1:
+                    depth[tree.children_left[node]] = depth[node] + 1
+                    depth[tree.children_right[node]] = depth[node] + 1
+            path_len[t, :n] = depth + _average_path_length(tree.n_node_samples)
+            
+        norm = n_trees * float(_average_path_length([self.model.max_samples_])[0])
+        self._trees = (feature, threshold, left, right, path_len, norm, float(self.model.offset_))
+        
+    def _prepare_scoring(self):
+        """Freeze the fitted forest for _score_batch, exporting ONNX only if that fails"""
+        self._onnx_bytes = None
+        self._ort_session = None
+        try:
+            self._freeze_trees()
+        except Exception as e:
+            logger.warning(f"Freezing trees failed, exporting ONNX instead: {e}")
+            self._trees = None
+            self._export_onnx()
+            
+    def _export_onnx(self):
+        """Convert the fitted forest to ONNX, falling back to sklearn scoring on failure"""
+        try:
+            onx = convert_sklearn(
+                self.model,
+                initial_types=[('X', FloatTensorType([None, 8]))],
+                target_opset=_ONNX_OPSET
+            )
+            self._load_session(onx.SerializeToString())
+        except Exception as e:
+            logger.warning(f"ONNX export failed, scoring with scikit-learn: {e}")
+            self._onnx_bytes = None
+            self._ort_session = None
+        
+    def extract_features(self, metrics_history: SiteHistory,
+                         time_features: Optional[Tuple[float, int]] = None) -> NetworkFeatures:
         """Extract features from metrics history"""
         if len(metrics_history) < 2:
             return NetworkFeatures(0, 0, 0, 0, 0, 0, 0, 0)
             
-        df = pd.DataFrame(metrics_history)
-        
-        # Throughput features
-        throughput_mean = df['throughput'].mean()
-        throughput_std = df['throughput'].std()
-        
-        # Calculate trend (simple linear regression slope)
-        if len(df) > 1:
-            x = np.arange(len(df)).reshape(-1, 1)
-            y = df['throughput'].values
-            reg = LinearRegression().fit(x, y)
-            throughput_trend = reg.coef_[0]
-        else:
-            throughput_trend = 0
-            
+        # Throughput features and trend (simple linear regression slope)
+        throughput_mean, throughput_std, throughput_trend = _one_pass_stats(
+            metrics_history.tail('throughput')
+        )
+        
         # Error rate
-        total_errors = df['errors'].sum()
-        error_rate = total_errors / len(df) if len(df) > 0 else 0
-        
-        # Utilization features
-        utilization_mean = df['utilization'].mean()
-        
-        # Utilization trend
-        if len(df) > 1:
-            x = np.arange(len(df)).reshape(-1, 1)
-            y = df['utilization'].values
-            reg = LinearRegression().fit(x, y)
-            utilization_trend = reg.coef_[0]
-        else:
-            utilization_trend = 0
-            
-        # Time-based features
-        now = datetime.now()
-        time_of_day = now.hour + now.minute / 60.0  # 0-24
-        day_of_week = now.weekday()  # 0-6
+        total_errors = metrics_history.tail('errors').sum()
+        error_rate = total_errors / len(metrics_history)
+        
+        # Utilization features and trend
+        utilization_mean, _, utilization_trend = _one_pass_stats(
+            metrics_history.tail('utilization')
+        )
+        
+        # Time-based features (computed once per batch by callers)
+        time_of_day, day_of_week = time_features or _time_features()
         
         return NetworkFeatures(
             throughput_mean=throughput_mean,
@@ -98,99 +339,178 @@ class AnomalyDetector:
             day_of_week=day_of_week
         )
         
-    def train(self, training_data: List[List[Dict]]):
+    def train(self, training_data: List[SiteHistory]):
         """Train the anomaly detection model"""
         logger.info("Training anomaly detection model...")
         
-        features_list = []
-        for site_history in training_data:
-            if len(site_history) > 10:  # Minimum data requirement
-                features = self.extract_features(site_history)
-                features_list.append([
-                    features.throughput_mean,
-                    features.throughput_std,
-                    features.throughput_trend,
-                    features.error_rate,
-                    features.utilization_mean,
-                    features.utilization_trend,
-                    features.time_of_day,
-                    features.day_of_week
-                ])
-                
+        # Extract per-site features on threads (the stat kernels release the GIL)
+        time_features = _time_features()
+        extracted = joblib.Parallel(n_jobs=-1, prefer='threads')(
+            joblib.delayed(self.extract_features)(site_history, time_features)
+            for site_history in training_data
+            if len(site_history) > 10  # Minimum data requirement
+        )
+        features_list = [
+            [
+                features.throughput_mean,
+                features.throughput_std,
+                features.throughput_trend,
+                features.error_rate,
+                features.utilization_mean,
+                features.utilization_trend,
+                features.time_of_day,
+                features.day_of_week
+            ]
+            for features in extracted
+        ]
+        
         if len(features_list) < 10:
             logger.warning("Insufficient training data, using default thresholds")
             return False
             
-        X = np.array(features_list)
+        X = np.array(features_list, dtype=np.float32)
         X_scaled = self.scaler.fit_transform(X)
         self.model.fit(X_scaled)
+        self._cache_scaler()
+        self._prepare_scoring()
         self.is_trained = True
+        self._unsaved = True
         
         logger.info(f"Model trained with {len(features_list)} samples")
         return True
         
-    def predict(self, metrics_history: List[Dict]) -> float:
+    def predict(self, metrics_history: SiteHistory,
+                time_features: Optional[Tuple[float, int]] = None) -> float:
         """Predict anomaly score for current metrics"""
+        return float(self.predict_batch([metrics_history], time_features)[0])
+        
+    def predict_batch(self, histories: List[SiteHistory],
+                      time_features: Optional[Tuple[float, int]] = None) -> np.ndarray:
+        """Predict anomaly scores for several sites with one model call"""
         if not self.is_trained:
             # Fallback to simple statistical detection
-            return self._simple_anomaly_detection(metrics_history)
+            return np.array(
+                [self._simple_anomaly_detection(h.tail('throughput')) for h in histories],
+                dtype=np.float64
+            )
             
-        features = self.extract_features(metrics_history)
-        X = np.array([[
-            features.throughput_mean,
-            features.throughput_std,
-            features.throughput_trend,
-            features.error_rate,
-            features.utilization_mean,
-            features.utilization_trend,
-            features.time_of_day,
-            features.day_of_week
-        ]])
-        
-        X_scaled = self.scaler.transform(X)
-        
-        # Get anomaly score (lower = more anomalous)
-        score = self.model.decision_function(X_scaled)[0]
+        if time_features is None:
+            time_features = _time_features()
+            
+        n = len(histories)
+        X = self._feat_buf if n == 1 else np.empty((n, 8), dtype=np.float32)
+        for i, metrics_history in enumerate(histories):
+            features = self.extract_features(metrics_history, time_features)
+            X[i, :] = (
+                features.throughput_mean,
+                features.throughput_std,
+                features.throughput_trend,
+                features.error_rate,
+                features.utilization_mean,
+                features.utilization_trend,
+                features.time_of_day,
+                features.day_of_week
+            )
+            
+        # Scale in place with the cached scaler statistics
+        np.subtract(X, self._mean, out=X)
+        np.divide(X, self._scale, out=X)
+        
+        # Get anomaly scores (lower = more anomalous)
+        if self._trees is not None:
+            scores = np.empty(n, dtype=np.float64)
+            _score_batch(X, *self._trees, scores)
+        elif self._ort_session is not None:
+            scores = self._ort_session.run(['scores'], {'X': X})[0].ravel()
+        else:
+            scores = self.model.decision_function(X)
         
         # Convert to 0-1 scale (higher = more anomalous)
-        anomaly_score = max(0, min(1, (0.5 - score) * 2))
-        
-        return anomaly_score
+        return np.clip((0.5 - scores) * 2, 0, 1)
         
-    def _simple_anomaly_detection(self, metrics_history: List[Dict]) -> float:
+    def _simple_anomaly_detection(self, throughput: np.ndarray) -> float:
         """Simple fallback anomaly detection"""
-        if len(metrics_history) < 10:
-            return 0.0
-            
-        df = pd.DataFrame(metrics_history)
-        recent_throughput = df['throughput'].iloc[-5:].mean()
-        historical_mean = df['throughput'].iloc[:-5].mean()
-        historical_std = df['throughput'].iloc[:-5].std()
-        
-        if historical_std == 0:
+        if len(throughput) < 10:
             return 0.0
             
-        z_score = abs(recent_throughput - historical_mean) / historical_std
-        return min(z_score / 3.0, 1.0)
+        return _zscore_score(throughput, 5)
         
     def save_model(self, filepath: str):
         """Save trained model to disk"""
-        if self.is_trained:
+        if self.is_trained and self._unsaved:
             model_data = {
                 'model': self.model,
                 'scaler': self.scaler,
                 'is_trained': self.is_trained
             }
             joblib.dump(model_data, filepath)
+            
+            # Frozen trees (or the ONNX fallback) and scaler parameters for fast startup
+            onnx_path, scaler_path, trees_path = _model_paths(filepath)
+            if self._trees is not None:
+                # Build the new set beside the old one: a loaded model may still
+                # have the old .npy files memory-mapped, so never write into them
+                tmp_path, old_path = trees_path + '.tmp', trees_path + '.old'
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                os.makedirs(tmp_path)
+                for name, values in zip(_TREE_FIELDS, self._trees):
+                    np.save(os.path.join(tmp_path, name + '.npy'), values)
+                # Written last, so its presence marks a complete set
+                np.save(os.path.join(tmp_path, 'params.npy'), np.array(self._trees[5:]))
+                
+                # Swap directories; existing mappings keep the unlinked files alive
+                shutil.rmtree(old_path, ignore_errors=True)
+                if os.path.exists(trees_path):
+                    os.replace(trees_path, old_path)
+                os.replace(tmp_path, trees_path)
+                shutil.rmtree(old_path, ignore_errors=True)
+                
+                # An ONNX file from an earlier fallback no longer matches the model
+                if os.path.exists(onnx_path):
+                    os.remove(onnx_path)
+            elif self._onnx_bytes is not None:
+                # Likewise stale trees would take priority over this ONNX forest on load
+                shutil.rmtree(trees_path, ignore_errors=True)
+                with open(onnx_path, 'wb') as f:
+                    f.write(self._onnx_bytes)
+            np.savez(scaler_path, mean=self._mean, scale=self._scale)
+            self._unsaved = False
+            
             logger.info(f"Model saved to {filepath}")
             
     def load_model(self, filepath: str) -> bool:
         """Load trained model from disk"""
         try:
+            onnx_path, scaler_path, trees_path = _model_paths(filepath)
+            has_trees = os.path.exists(os.path.join(trees_path, 'params.npy'))
+            has_onnx = os.path.exists(onnx_path)
+            if os.path.exists(scaler_path) and (has_trees or has_onnx):
+                # Skip unpickling the sklearn forest; score through the frozen
+                # trees, or onnxruntime when they are missing
+                if has_trees:
+                    # Memory-mapped, so worker processes share the tree pages
+                    norm, offset = np.load(os.path.join(trees_path, 'params.npy')).tolist()
+                    self._trees = tuple(
+                        np.load(os.path.join(trees_path, name + '.npy'), mmap_mode='r')
+                        for name in _TREE_FIELDS
+                    ) + (norm, offset)
+                else:
+                    with open(onnx_path, 'rb') as f:
+                        self._load_session(f.read())
+                with np.load(scaler_path) as params:
+                    self._mean = params['mean']
+                    self._scale = params['scale']
+                self.is_trained = True
+                logger.info(f"Model loaded from {trees_path if has_trees else onnx_path}")
+                return True
+                
             model_data = joblib.load(filepath)
             self.model = model_data['model']
             self.scaler = model_data['scaler']
             self.is_trained = model_data['is_trained']
+            self._cache_scaler()
+            if self.is_trained:
+                self._prepare_scoring()
             logger.info(f"Model loaded from {filepath}")
             return True
         except Exception as e:
@@ -208,89 +528,100 @@ class TrafficForecaster:
         
     def prepare_sequences(self, data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """Prepare sequences for training/prediction"""
-        X, y = [], []
-        for i in range(len(data) - self.sequence_length):
-            X.append(data[i:(i + self.sequence_length)])
-            y.append(data[i + self.sequence_length])
-        return np.array(X), np.array(y)
+        if len(data) <= self.sequence_length:
+            return np.empty((0, self.sequence_length), dtype=data.dtype), data[:0].copy()
+            
+        # Overlapping windows as a strided view, copied once into a dense matrix
+        windows = np.lib.stride_tricks.sliding_window_view(data, self.sequence_length)
+        return np.ascontiguousarray(windows[:-1]), data[self.sequence_length:].copy()
         
-    def train(self, training_data: List[List[Dict]]):
+    def train(self, training_data: List[SiteHistory]):
         """Train the forecasting model (simplified for MVP)"""
         logger.info("Training traffic forecasting model...")
         
         # For MVP, use simple linear regression instead of LSTM
         from sklearn.linear_model import LinearRegression
         
-        all_sequences = []
-        all_targets = []
+        throughput_series = [
+            site_history.tail('throughput')
+            for site_history in training_data
+            if len(site_history) > self.sequence_length + 10
+        ]
         
-        for site_history in training_data:
-            if len(site_history) > self.sequence_length + 10:
-                df = pd.DataFrame(site_history)
-                throughput_data = df['throughput'].values
-                
-                # Normalize data
-                throughput_scaled = self.scaler.fit_transform(
-                    throughput_data.reshape(-1, 1)
-                ).flatten()
-                
-                X, y = self.prepare_sequences(throughput_scaled)
-                
-                # Flatten sequences for linear regression
-                X_flat = X.reshape(X.shape[0], -1)
-                
-                all_sequences.extend(X_flat)
-                all_targets.extend(y)
-                
-        if len(all_sequences) < 10:
+        n_sequences = sum(len(t) - self.sequence_length for t in throughput_series)
+        if n_sequences < 10:
             logger.warning("Insufficient training data for forecasting")
             return False
             
+        # Normalize data with one scaler fit across every site
+        self.scaler.fit(np.concatenate(throughput_series).reshape(-1, 1))
+        
+        # Build each site's scaled windows on threads
+        sequences = joblib.Parallel(n_jobs=-1, prefer='threads')(
+            joblib.delayed(self._site_sequences)(throughput_data)
+            for throughput_data in throughput_series
+        )
+        all_sequences = [X for X, _ in sequences]
+        all_targets = [y for _, y in sequences]
+        
         self.model = LinearRegression()
-        self.model.fit(all_sequences, all_targets)
+        self.model.fit(np.vstack(all_sequences), np.concatenate(all_targets))
         self.is_trained = True
         
-        logger.info(f"Forecasting model trained with {len(all_sequences)} sequences")
+        logger.info(f"Forecasting model trained with {n_sequences} sequences")
         return True
         
-    def predict(self, metrics_history: List[Dict], forecast_minutes: int = 15) -> int:
+    def _site_sequences(self, throughput_data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Scale one site's throughput and cut it into training windows"""
+        throughput_scaled = self.scaler.transform(
+            throughput_data.reshape(-1, 1)
+        ).ravel()
+        return self.prepare_sequences(throughput_scaled)
+        
+    def predict(self, metrics_history: SiteHistory, forecast_minutes: int = 15) -> int:
         """Predict traffic for specified minutes ahead"""
-        if not self.is_trained or len(metrics_history) < self.sequence_length:
-            # Fallback to simple trend extrapolation
-            return self._simple_forecast(metrics_history, forecast_minutes)
+        return int(self.predict_batch([metrics_history], forecast_minutes)[0])
+        
+    def predict_batch(self, histories: List[SiteHistory], forecast_minutes: int = 15) -> np.ndarray:
+        """Predict traffic for several sites with one model call"""
+        forecasts = np.empty(len(histories), dtype=np.int64)
+        ready = []
+        for i, metrics_history in enumerate(histories):
+            if not self.is_trained or len(metrics_history) < self.sequence_length:
+                # Fallback to simple trend extrapolation
+                forecasts[i] = self._simple_forecast(
+                    metrics_history.tail('throughput', 5), forecast_minutes
+                )
+            else:
+                ready.append(i)
+                
+        if not ready:
+            return forecasts
+            
+        # Stack the recent sequences, one row per site
+        X = np.empty((len(ready), self.sequence_length), dtype=np.float32)
+        for row, i in enumerate(ready):
+            X[row] = histories[i].tail('throughput', self.sequence_length)
             
-        df = pd.DataFrame(metrics_history)
-        recent_data = df['throughput'].iloc[-self.sequence_length:].values
-        
         # Normalize
-        recent_scaled = self.scaler.transform(recent_data.reshape(-1, 1)).flatten()
-        
-        # Prepare sequence
-        X = recent_scaled.reshape(1, -1)
-        
-        # Predict
-        predicted_scaled = self.model.predict(X)[0]
+        mean, scale = self.scaler.mean_[0], self.scaler.scale_[0]
+        X -= mean
+        X /= scale
         
-        # Denormalize
-        predicted = self.scaler.inverse_transform([[predicted_scaled]])[0][0]
+        # Predict and denormalize
+        predicted = self.model.predict(X) * scale + mean
         
-        return max(0, int(predicted))
+        forecasts[ready] = np.maximum(np.trunc(predicted), 0)
+        return forecasts
         
-    def _simple_forecast(self, metrics_history: List[Dict], forecast_minutes: int) -> int:
-        """Simple trend-based forecasting"""
-        if len(metrics_history) < 5:
-            return metrics_history[-1]['throughput'] if metrics_history else 1000
+    def _simple_forecast(self, recent_throughput: np.ndarray, forecast_minutes: int) -> int:
+        """Simple trend-based forecasting from the last five throughput samples"""
+        if len(recent_throughput) < 5:
+            return int(recent_throughput[-1]) if len(recent_throughput) else 1000
             
-        df = pd.DataFrame(metrics_history)
-        recent_throughput = df['throughput'].iloc[-5:].values
-        
-        # Calculate trend
-        x = np.arange(len(recent_throughput))
-        slope = np.polyfit(x, recent_throughput, 1)[0]
-        
-        # Forecast (assuming 1-second intervals)
+        # Forecast along the recent trend (assuming 1-second intervals)
         forecast_points = forecast_minutes * 60
-        predicted = recent_throughput[-1] + slope * forecast_points
+        predicted = _trend_forecast(recent_throughput[-5:], forecast_points)
         
         return max(0, int(predicted))
 
@@ -303,45 +634,110 @@ class AIInferenceService:
         self.traffic_forecaster = TrafficForecaster()
         self.site_histories = {}
         
+        # (unix second, time_of_day, day_of_week) shared by every site in a tick
+        self._time_features_cache = (0, 0.0, 0)
+        
+        # Per-site results keyed by history version, reused until new samples arrive
+        self._anomaly_cache: Dict[str, Tuple[int, Tuple[float, int], float]] = {}
+        self._forecast_cache: Dict[str, Tuple[int, int, int]] = {}
+        
         # Create models directory
         os.makedirs(models_dir, exist_ok=True)
         
+        # Compile the numeric kernels before the first inference call
+        _ensure_warm()
+        
         # Try to load existing models
         self.load_models()
         
     def update_site_history(self, site_name: str, metrics: Dict):
         """Update historical data for a site"""
         if site_name not in self.site_histories:
-            self.site_histories[site_name] = []
+            # Keep only recent history (24 hours at 1-second intervals)
+            self.site_histories[site_name] = SiteHistory(24 * 60 * 60)
             
-        self.site_histories[site_name].append({
-            'timestamp': metrics.get('timestamp', 0),
-            'throughput': metrics.get('throughput_gbps', 0),
-            'errors': metrics.get('error_count', 0),
-            'utilization': metrics.get('utilization', 0)
-        })
-        
-        # Keep only recent history (24 hours at 1-second intervals)
-        max_history = 24 * 60 * 60
-        if len(self.site_histories[site_name]) > max_history:
-            self.site_histories[site_name] = self.site_histories[site_name][-max_history:]
+        self.site_histories[site_name].append(
+            metrics.get('timestamp', 0),
+            metrics.get('throughput_gbps', 0),
+            metrics.get('error_count', 0),
+            metrics.get('utilization', 0)
+        )
+        
+    def update_site_history_batch(self, site_name: str, timestamps: np.ndarray,
+                                  throughputs: np.ndarray, errors: np.ndarray,
+                                  utilizations: np.ndarray):
+        """Append a block of samples for a site in one call"""
+        if site_name not in self.site_histories:
+            self.site_histories[site_name] = SiteHistory(24 * 60 * 60)
             
+        self.site_histories[site_name].extend(timestamps, throughputs, errors, utilizations)
+        
+    def _current_time_features(self) -> Tuple[float, int]:
+        """Return time features, recomputed at most once per second"""
+        now_ts = int(time.time())
+        if now_ts != self._time_features_cache[0]:
+            self._time_features_cache = (now_ts, *_time_features())
+        return self._time_features_cache[1:]
+        
     def detect_anomaly(self, site_name: str) -> float:
         """Detect anomaly for a site"""
-        if site_name not in self.site_histories:
-            return 0.0
-            
-        return self.anomaly_detector.predict(self.site_histories[site_name])
+        return float(self.detect_anomalies_batch([site_name])[0])
+        
+    def detect_anomalies_batch(self, site_names: List[str]) -> np.ndarray:
+        """Detect anomalies for several sites with one model call"""
+        scores = np.zeros(len(site_names), dtype=np.float64)
+        time_features = self._current_time_features()
+        
+        stale = []
+        for i, site in enumerate(site_names):
+            history = self.site_histories.get(site)
+            if history is None:
+                continue
+            cached = self._anomaly_cache.get(site)
+            if cached and cached[0] == history.version and cached[1] == time_features:
+                scores[i] = cached[2]
+            else:
+                stale.append(i)
+                
+        if stale:
+            histories = [self.site_histories[site_names[i]] for i in stale]
+            fresh = self.anomaly_detector.predict_batch(histories, time_features)
+            scores[stale] = fresh
+            for i, history, score in zip(stale, histories, fresh.tolist()):
+                self._anomaly_cache[site_names[i]] = (history.version, time_features, score)
+        return scores
         
     def forecast_traffic(self, site_name: str, forecast_minutes: int = 15) -> int:
         """Forecast traffic for a site"""
-        if site_name not in self.site_histories:
-            return 1000  # Default value
-            
-        return self.traffic_forecaster.predict(
-            self.site_histories[site_name], 
-            forecast_minutes
-        )
+        return int(self.forecast_traffic_batch([site_name], forecast_minutes)[0])
+        
+    def forecast_traffic_batch(self, site_names: List[str], forecast_minutes: int = 15) -> np.ndarray:
+        """Forecast traffic for several sites with one model call"""
+        forecasts = np.full(len(site_names), 1000, dtype=np.int64)  # Default value
+        
+        stale = []
+        for i, site in enumerate(site_names):
+            history = self.site_histories.get(site)
+            if history is None:
+                continue
+            cached = self._forecast_cache.get(site)
+            if cached and cached[0] == history.version and cached[1] == forecast_minutes:
+                forecasts[i] = cached[2]
+            else:
+                stale.append(i)
+                
+        if stale:
+            histories = [self.site_histories[site_names[i]] for i in stale]
+            fresh = self.traffic_forecaster.predict_batch(histories, forecast_minutes)
+            forecasts[stale] = fresh
+            for i, history, forecast in zip(stale, histories, fresh.tolist()):
+                self._forecast_cache[site_names[i]] = (history.version, forecast_minutes, forecast)
+        return forecasts
+        
+    def _invalidate_caches(self):
+        """Drop cached per-site results after the models change"""
+        self._anomaly_cache.clear()
+        self._forecast_cache.clear()
         
     def train_models(self):
         """Train all AI models with available data"""
@@ -356,6 +752,7 @@ class AIInferenceService:
         
         # Train traffic forecaster
         forecast_success = self.traffic_forecaster.train(training_data)
+        self._invalidate_caches()
         
         if anomaly_success or forecast_success:
             self.save_models()
@@ -405,6 +802,7 @@ class AIInferenceService:
                 self.traffic_forecaster.sequence_length = model_data['sequence_length']
                 self.traffic_forecaster.is_trained = model_data['is_trained']
                 
+            self._invalidate_caches()
             logger.info("Models loaded successfully")
             
         except Exception as e:
@@ -415,29 +813,28 @@ def main():
     ai_service = AIInferenceService()
     
     # Generate some test data
-    import random
-    import time
-    
+    rng = np.random.default_rng()
     sites = ['MicrosoftDC', 'Dallas', 'Dobbins', 'Stone']
     
-    for i in range(100):
-        for site in sites:
-            metrics = {
-                'timestamp': int(time.time()) + i,
-                'throughput_gbps': random.randint(800, 2000),
-                'error_count': random.randint(0, 5),
-                'utilization': random.uniform(60, 95)
-            }
-            ai_service.update_site_history(site, metrics)
-            
+    start = int(time.time())
+    timestamps = np.arange(start, start + 100)
+    for site in sites:
+        ai_service.update_site_history_batch(
+            site,
+            timestamps,
+            rng.integers(800, 2001, size=100),
+            rng.integers(0, 6, size=100),
+            rng.uniform(60, 95, size=100)
+        )
+        
     # Train models
     ai_service.train_models()
     
     # Test inference
-    for site in sites:
-        anomaly_score = ai_service.detect_anomaly(site)
-        forecast = ai_service.forecast_traffic(site)
-        
+    anomaly_scores = ai_service.detect_anomalies_batch(sites)
+    forecasts = ai_service.forecast_traffic_batch(sites)
+    
+    for site, anomaly_score, forecast in zip(sites, anomaly_scores, forecasts):
         print(f"{site}: Anomaly={anomaly_score:.3f}, Forecast={forecast} Gbps")
 
 if __name__ == '__main__':
@@ -7,23 +7,59 @@ Author: Soufian Carson
 License: MIT
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, make_response, render_template
 from flask_cors import CORS
+from flask_compress import Compress
 import json
+import orjson
 import time
+import math
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import os
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 import sqlite3
 import threading
-from contextlib import contextmanager
+import queue
+import atexit
+from contextlib import closing, contextmanager
+from functools import wraps
+from collections import deque
+from itertools import takewhile
+from operator import itemgetter
+import heapq
 
 # Configuration
 API_PORT = 5000
 DB_PATH = "skma_fon.db"
 RETENTION_DAYS = 30
+INSERT_BATCH_SIZE = 500  # rows per executemany() call
+DB_POOL_SIZE = 8  # idle connections kept open per DatabaseManager
+CLEANUP_CHUNK_SIZE = 5000  # rows removed per retention DELETE transaction
+CLEANUP_PAUSE = 0.05  # seconds between chunks so ingest can take the write lock
+RESPONSE_CACHE_TTL = 2.0  # seconds a GET response body is reused
+RESPONSE_CACHE_SIZE = 256  # cached responses kept before expired/oldest ones are dropped
+INGEST_QUEUE_SIZE = 200  # pending ingest requests before POSTs are refused
+INGEST_MAX_RECORDS = 1000  # sites per POST, so the queue holds at most 200k records
+WRITER_SHUTDOWN_TIMEOUT = 10.0  # seconds to wait for the final flush at exit
+WRITE_BATCH_SIZE = 500  # records the writer gathers into one transaction
+WRITE_FLUSH_INTERVAL = 0.1  # seconds the writer waits for more records
+ETAG_WINDOW = 60  # seconds an ETag stays valid when no ingest arrives
+ROLLUP_MIN_HOURS = 6  # per-site windows at least this long default to hourly rollups
+PAGE_SIZE = 1000  # default and maximum rows per page of site history or anomalies
+U32_MAX = 2**32 - 1  # width of the kernel's per-site counters
+DASHBOARD_MAX_AGE = 3600  # seconds browsers may reuse the static dashboard files
+
+# Per-connection SQLite tuning (mmap bounded to keep RSS predictable)
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA busy_timeout=5000",
+)
 
 # Setup logging
 logging.basicConfig(
@@ -46,26 +82,118 @@ class MetricRecord:
     anomaly_score: float = 0.0
     forecast_gbps: int = 0
 
+@dataclass
+class HourlyRecord:
+    """Per-site rollup of one hour of metrics"""
+    timestamp: int = 0  # start of the hour
+    site_name: str = ""
+    sample_count: int = 0
+    avg_throughput_gbps: float = 0.0
+    max_utilization: float = 0.0
+    error_count: int = 0
+    max_anomaly_score: float = 0.0
+
+def _hourly_factory(cursor: sqlite3.Cursor, row: tuple) -> HourlyRecord:
+    """Row factory building HourlyRecord from a metrics_hourly query"""
+    return HourlyRecord(*row)
+
+def _metric_factory(cursor: sqlite3.Cursor, row: tuple) -> MetricRecord:
+    """Row factory building MetricRecord straight from a `SELECT *` row"""
+    return MetricRecord(*row)
+
+def _int_field(site_data: Dict, name: str, default: int,
+               low: int = -2**63, high: int = 2**63 - 1) -> int:
+    """Read an integer ingest field, rejecting values outside [low, high] (default: SQLite's int64)"""
+    value = int(site_data.get(name, default))
+    if not low <= value <= high:
+        raise ValueError(f"{name} out of range")
+    return value
+    
+def _float_field(site_data: Dict, name: str, default: float) -> float:
+    """Read a float ingest field, rejecting NaN/inf (stored as NULL by SQLite)"""
+    value = float(site_data.get(name, default))
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be finite")
+    return value
+    
+def _parse_metric(site_data: Dict) -> MetricRecord:
+    """Build a MetricRecord from one ingest entry, raising ValueError on bad fields"""
+    if not isinstance(site_data, dict):
+        raise ValueError("each site entry must be an object")
+    site_name = site_data.get('site_name', '')
+    if not isinstance(site_name, str):
+        raise ValueError("site_name must be a string")
+    try:
+        return MetricRecord(
+            timestamp=_int_field(site_data, 'timestamp', int(time.time())),
+            site_name=site_name,
+            # u32 counters as in the kernel struct; also keeps the rollup sums inside int64
+            throughput_gbps=_int_field(site_data, 'throughput_gbps', 0, 0, U32_MAX),
+            error_count=_int_field(site_data, 'error_count', 0, 0, U32_MAX),
+            ber_errors=_int_field(site_data, 'ber_errors', 0, 0, U32_MAX),
+            link_status=_int_field(site_data, 'link_status', 1, 0, U32_MAX),
+            utilization=_float_field(site_data, 'utilization', 0.0),
+            anomaly_score=_float_field(site_data, 'anomaly_score', 0.0),
+            forecast_gbps=_int_field(site_data, 'forecast_gbps', 0)
+        )
+    except (TypeError, OverflowError) as e:  # int(None) for a null, int(inf) for Infinity
+        raise ValueError(str(e))
+        
+def _json(payload) -> Response:
+    """Serialize a payload to a JSON response with orjson (dataclasses included)"""
+    return Response(orjson.dumps(payload), mimetype='application/json')
+
 class DatabaseManager:
     """SQLite database manager for storing metrics"""
     
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
+        # Idle connections shared by the server's worker threads; sqlite3 releases
+        # the GIL, so queries on different connections overlap
+        self._pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
         self.init_database()
         
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new database connection"""
+        # Autocommit mode: write transactions are opened explicitly with BEGIN IMMEDIATE
+        # Pooled connections move between threads, but only one holder uses each at a time
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+        
     @contextmanager
     def get_connection(self):
-        """Get database connection with context manager"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Borrow a pooled database connection with context manager"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
         try:
             yield conn
+        except Exception:
+            # Don't leave a half-done transaction on the reused connection
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
             
     def init_database(self):
         """Initialize database tables"""
-        with self.get_connection() as conn:
+        # Dedicated connection, so schema setup never shares a pooled one
+        with closing(self._connect()) as conn:
+            # Only takes effect on a fresh file (before the first table exists)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            
+            # WAL is persistent, so readers stop blocking the ingest writer
+            conn.execute("PRAGMA journal_mode=WAL")
+            
+            conn.execute("BEGIN IMMEDIATE")
+            
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS metrics (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -91,119 +219,326 @@ class DatabaseManager:
                 ON metrics(site_name, timestamp)
             """)
             
+            # Partial index over the anomalous tail, already in ORDER BY order
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_anomaly 
+                ON metrics(anomaly_score DESC, timestamp DESC)
+                WHERE anomaly_score >= 0.5
+            """)
+            
+            # Per-site aggregate maintained on ingest, so /api/sites never scans metrics
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS site_summary (
+                    site_name TEXT PRIMARY KEY,
+                    last_seen INTEGER NOT NULL,
+                    record_count INTEGER NOT NULL
+                )
+            """)
+            
+            # Backfill once for databases created before the summary existed
+            if conn.execute("SELECT 1 FROM site_summary LIMIT 1").fetchone() is None:
+                conn.execute("""
+                    INSERT INTO site_summary (site_name, last_seen, record_count)
+                    SELECT site_name, MAX(timestamp), COUNT(*)
+                    FROM metrics
+                    GROUP BY site_name
+                """)
+                
+            # Hourly rollup maintained on ingest, for long per-site windows
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metrics_hourly (
+                    site_name TEXT NOT NULL,
+                    hour_ts INTEGER NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    sum_throughput INTEGER NOT NULL,
+                    max_util REAL NOT NULL,
+                    sum_errors INTEGER NOT NULL,
+                    max_anom REAL NOT NULL,
+                    PRIMARY KEY (site_name, hour_ts)
+                )
+            """)
+            
+            if conn.execute("SELECT 1 FROM metrics_hourly LIMIT 1").fetchone() is None:
+                conn.execute("""
+                    INSERT INTO metrics_hourly (
+                        site_name, hour_ts, sample_count, sum_throughput,
+                        max_util, sum_errors, max_anom
+                    )
+                    SELECT site_name, timestamp / 3600 * 3600, COUNT(*), TOTAL(throughput_gbps),
+                           MAX(utilization), TOTAL(error_count), MAX(anomaly_score)
+                    FROM metrics
+                    GROUP BY site_name, timestamp / 3600
+                """)
+                
             conn.commit()
             logger.info("Database initialized")
             
     def insert_metrics(self, metrics: List[MetricRecord]):
         """Insert multiple metric records"""
+        rows = [
+            (
+                metric.timestamp, metric.site_name, metric.throughput_gbps,
+                metric.error_count, metric.ber_errors, metric.link_status,
+                metric.utilization, metric.anomaly_score, metric.forecast_gbps
+            )
+            for metric in metrics
+        ]
+        
+        # Deduplicate the batch into one (last_seen, count) per site
+        summary = {}
+        for metric in metrics:
+            last_seen, count = summary.get(metric.site_name, (metric.timestamp, 0))
+            summary[metric.site_name] = (max(last_seen, metric.timestamp), count + 1)
+            
+        # ... and into one rollup row per (site, hour)
+        hourly = {}
+        for metric in metrics:
+            key = (metric.site_name, metric.timestamp // 3600 * 3600)
+            count, throughput, util, errors, anom = hourly.get(key, (0, 0, metric.utilization, 0, metric.anomaly_score))
+            hourly[key] = (
+                count + 1, throughput + metric.throughput_gbps, max(util, metric.utilization),
+                errors + metric.error_count, max(anom, metric.anomaly_score)
+            )
+            
         with self.get_connection() as conn:
-            for metric in metrics:
-                conn.execute("""
+            # Take the write lock up front instead of upgrading mid-transaction
+            conn.execute("BEGIN IMMEDIATE")
+            
+            # One prepared statement per chunk, bounded to INSERT_BATCH_SIZE rows
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                conn.executemany("""
                     INSERT INTO metrics (
                         timestamp, site_name, throughput_gbps, error_count,
                         ber_errors, link_status, utilization, anomaly_score, forecast_gbps
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    metric.timestamp, metric.site_name, metric.throughput_gbps,
-                    metric.error_count, metric.ber_errors, metric.link_status,
-                    metric.utilization, metric.anomaly_score, metric.forecast_gbps
-                ))
+                """, rows[start:start + INSERT_BATCH_SIZE])
+                
+            conn.executemany("""
+                INSERT INTO site_summary (site_name, last_seen, record_count)
+                VALUES (?, ?, ?)
+                ON CONFLICT(site_name) DO UPDATE SET
+                    last_seen = MAX(last_seen, excluded.last_seen),
+                    record_count = record_count + excluded.record_count
+            """, [(site, last_seen, count) for site, (last_seen, count) in summary.items()])
+            
+            conn.executemany("""
+                INSERT INTO metrics_hourly (
+                    site_name, hour_ts, sample_count, sum_throughput,
+                    max_util, sum_errors, max_anom
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(site_name, hour_ts) DO UPDATE SET
+                    sample_count = sample_count + excluded.sample_count,
+                    sum_throughput = sum_throughput + excluded.sum_throughput,
+                    max_util = MAX(max_util, excluded.max_util),
+                    sum_errors = sum_errors + excluded.sum_errors,
+                    max_anom = MAX(max_anom, excluded.max_anom)
+            """, [key + values for key, values in hourly.items()])
             conn.commit()
             
+    def _query_metrics(self, sql: str, params: tuple, factory=_metric_factory) -> list:
+        """Run a query and build one record per row (MetricRecords for `SELECT * FROM metrics`)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = factory
+            return cursor.execute(sql, params).fetchall()
+            
     def get_latest_metrics(self, limit: int = 100) -> List[MetricRecord]:
         """Get latest metrics for all sites"""
-        with self.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT * FROM metrics 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (limit,))
-            
-            records = []
-            for row in cursor.fetchall():
-                records.append(MetricRecord(
-                    id=row['id'],
-                    timestamp=row['timestamp'],
-                    site_name=row['site_name'],
-                    throughput_gbps=row['throughput_gbps'],
-                    error_count=row['error_count'],
-                    ber_errors=row['ber_errors'],
-                    link_status=row['link_status'],
-                    utilization=row['utilization'],
-                    anomaly_score=row['anomaly_score'],
-                    forecast_gbps=row['forecast_gbps']
-                ))
-            return records
-            
-    def get_site_metrics(self, site_name: str, hours: int = 24) -> List[MetricRecord]:
-        """Get metrics for a specific site"""
+        return self._query_metrics("""
+            SELECT * FROM metrics 
+            ORDER BY timestamp DESC 
+            LIMIT ?
+        """, (limit,))
+            
+    def get_site_metrics(self, site_name: str, hours: int = 24, limit: int = PAGE_SIZE,
+                         before: Optional[int] = None,
+                         before_id: Optional[int] = None) -> List[MetricRecord]:
+        """Get metrics for a specific site, newest first, optionally after the (before, before_id) cursor"""
         start_time = int(time.time()) - (hours * 3600)
         
-        with self.get_connection() as conn:
-            cursor = conn.execute("""
+        if before is not None:
+            # Keyset page on (timestamp, id), since timestamps repeat; idx_site_timestamp
+            # carries the rowid, so this stays a range scan however deep the page
+            return self._query_metrics("""
                 SELECT * FROM metrics 
                 WHERE site_name = ? AND timestamp >= ?
-                ORDER BY timestamp DESC
-            """, (site_name, start_time))
-            
-            records = []
-            for row in cursor.fetchall():
-                records.append(MetricRecord(
-                    id=row['id'],
-                    timestamp=row['timestamp'],
-                    site_name=row['site_name'],
-                    throughput_gbps=row['throughput_gbps'],
-                    error_count=row['error_count'],
-                    ber_errors=row['ber_errors'],
-                    link_status=row['link_status'],
-                    utilization=row['utilization'],
-                    anomaly_score=row['anomaly_score'],
-                    forecast_gbps=row['forecast_gbps']
-                ))
-            return records
-            
-    def get_anomalies(self, threshold: float = 0.8, hours: int = 24) -> List[MetricRecord]:
+                  AND (timestamp < ? OR (timestamp = ? AND id < ?))
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, (site_name, start_time, before, before, -1 if before_id is None else before_id, limit))
+            
+        return self._query_metrics("""
+            SELECT * FROM metrics 
+            WHERE site_name = ? AND timestamp >= ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (site_name, start_time, limit))
+            
+    def get_site_rollup(self, site_name: str, hours: int = 24, limit: int = PAGE_SIZE,
+                        before: Optional[int] = None) -> List[HourlyRecord]:
+        """Get hourly rollups for a specific site, newest first, optionally older than `before`"""
+        # Include the partial hour the window starts in
+        start_hour = (int(time.time()) - (hours * 3600)) // 3600 * 3600
+        
+        if before is not None:
+            return self._query_metrics("""
+                SELECT hour_ts, site_name, sample_count, CAST(sum_throughput AS REAL) / sample_count,
+                       max_util, sum_errors, max_anom
+                FROM metrics_hourly
+                WHERE site_name = ? AND hour_ts >= ? AND hour_ts < ?
+                ORDER BY hour_ts DESC
+                LIMIT ?
+            """, (site_name, start_hour, before, limit), _hourly_factory)
+            
+        return self._query_metrics("""
+            SELECT hour_ts, site_name, sample_count, CAST(sum_throughput AS REAL) / sample_count,
+                   max_util, sum_errors, max_anom
+            FROM metrics_hourly
+            WHERE site_name = ? AND hour_ts >= ?
+            ORDER BY hour_ts DESC
+            LIMIT ?
+        """, (site_name, start_hour, limit), _hourly_factory)
+            
+    def get_anomalies(self, threshold: float = 0.8, hours: int = 24, limit: int = PAGE_SIZE,
+                      offset: int = 0) -> List[MetricRecord]:
         """Get anomalous metrics"""
         start_time = int(time.time()) - (hours * 3600)
         
-        with self.get_connection() as conn:
-            cursor = conn.execute("""
+        if threshold >= 0.5:
+            # The literal term lets SQLite prove idx_anomaly's WHERE clause holds
+            return self._query_metrics("""
                 SELECT * FROM metrics 
-                WHERE anomaly_score >= ? AND timestamp >= ?
+                WHERE anomaly_score >= ? AND anomaly_score >= 0.5 AND timestamp >= ?
                 ORDER BY anomaly_score DESC, timestamp DESC
-            """, (threshold, start_time))
-            
-            records = []
-            for row in cursor.fetchall():
-                records.append(MetricRecord(
-                    id=row['id'],
-                    timestamp=row['timestamp'],
-                    site_name=row['site_name'],
-                    throughput_gbps=row['throughput_gbps'],
-                    error_count=row['error_count'],
-                    ber_errors=row['ber_errors'],
-                    link_status=row['link_status'],
-                    utilization=row['utilization'],
-                    anomaly_score=row['anomaly_score'],
-                    forecast_gbps=row['forecast_gbps']
-                ))
-            return records
+                LIMIT ? OFFSET ?
+            """, (threshold, start_time, limit, offset))
+            
+        return self._query_metrics("""
+            SELECT * FROM metrics 
+            WHERE anomaly_score >= ? AND timestamp >= ?
+            ORDER BY anomaly_score DESC, timestamp DESC
+            LIMIT ? OFFSET ?
+        """, (threshold, start_time, limit, offset))
+            
+    def get_sites(self, since: int) -> List[sqlite3.Row]:
+        """Get sites seen since a timestamp, most recent first"""
+        with self.get_connection() as conn:
+            return conn.execute("""
+                SELECT site_name, last_seen, record_count
+                FROM site_summary
+                WHERE last_seen >= ?
+                ORDER BY last_seen DESC
+            """, (since,)).fetchall()
             
     def cleanup_old_data(self):
         """Remove old data beyond retention period"""
         cutoff_time = int(time.time()) - (RETENTION_DAYS * 24 * 3600)
         
+        deleted_count = 0
+        
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                DELETE FROM metrics WHERE timestamp < ?
-            """, (cutoff_time,))
-            
-            deleted_count = cursor.rowcount
-            conn.commit()
-            
+            # Each autocommitted chunk keeps the write transaction (and the WAL) small
+            while True:
+                cursor = conn.execute("""
+                    DELETE FROM metrics WHERE id IN (
+                        SELECT id FROM metrics WHERE timestamp < ? LIMIT ?
+                    )
+                """, (cutoff_time, CLEANUP_CHUNK_SIZE))
+                
+                if cursor.rowcount <= 0:
+                    break
+                deleted_count += cursor.rowcount
+                time.sleep(CLEANUP_PAUSE)
+                
+            # Recount the retained rows per site (index-only on idx_site_timestamp)
             if deleted_count > 0:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    UPDATE site_summary SET record_count = (
+                        SELECT COUNT(*) FROM metrics
+                        WHERE metrics.site_name = site_summary.site_name
+                    )
+                """)
+                conn.execute("DELETE FROM site_summary WHERE record_count = 0")
+                # Rollup hours that ended before the cutoff
+                conn.execute("DELETE FROM metrics_hourly WHERE hour_ts <= ?", (cutoff_time - 3600,))
+                conn.commit()
+                
+                # Shrink the WAL back down and hand freed pages to the OS
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.execute("PRAGMA incremental_vacuum").fetchall()  # runs one page per step
+                
                 logger.info(f"Cleaned up {deleted_count} old records")
 
+class ResponseCache:
+    """Short-lived cache of encoded GET responses, cleared on every ingest"""
+    
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0  # bumped by invalidate()
+        self._epoch = int(time.time())  # keeps ETags from repeating across restarts
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Let browsers (and tabs sharing their cache) reuse a body for as long as we do
+        self.cache_control = f"public, max-age={int(ttl)}"
+        
+    def invalidate(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            
+    def _make_room(self, now: float):
+        """Drop expired entries, then the oldest, until one more fits (lock held)"""
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]  # dicts keep insertion order
+            
+    @staticmethod
+    def _client_has(etag: str) -> bool:
+        """Check If-None-Match, ignoring the ':<algorithm>' suffix Flask-Compress appends"""
+        tags = request.if_none_match.as_set(include_weak=True)
+        return any(tag.split(':')[0] == etag for tag in tags)
+        
+    def _tag(self, response: Response, etag: str) -> Response:
+        """Attach validator and browser caching headers"""
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        return response
+        
+    def cached(self, view):
+        """Decorate a GET view so its 200 responses are reused for `ttl` seconds"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                generation = self.generation
+                
+            # Unchanged since the client's copy (bucketed so time windows still roll forward)
+            etag = f"{self._epoch}-{generation}-{int(time.time()) // ETAG_WINDOW}"
+            if self._client_has(etag):
+                return self._tag(Response(status=304), etag)
+                
+            if entry is not None and entry[0] > now:
+                return self._tag(Response(entry[1], mimetype=entry[2]), etag)
+                
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                with self._lock:
+                    # Skip storing if an ingest landed while the view ran
+                    if generation == self.generation:
+                        # Bounded even without ingest: any query string makes a new key
+                        if len(self._entries) >= self.max_entries:
+                            self._make_room(now)
+                        self._entries[key] = (now + self.ttl, response.get_data(), response.mimetype)
+                self._tag(response, etag)
+            return response
+        return wrapper
+
 class AlertManager:
     """Manages alerts and notifications"""
     
@@ -213,15 +548,21 @@ class AlertManager:
             'utilization': 90.0,
             'error_rate': 10
         }
-        self.recent_alerts = []
+        self.recent_alerts = deque()  # kept sorted by alert timestamp
+        self._lock = threading.Lock()  # deques can't be iterated while another thread mutates them
         
     def check_alerts(self, metrics: List[MetricRecord]) -> List[Dict]:
         """Check for alert conditions"""
         alerts = []
         
+        # Thresholds as locals: the common no-alert path is three plain compares
+        anomaly_threshold = self.alert_thresholds['anomaly_score']
+        utilization_threshold = self.alert_thresholds['utilization']
+        error_threshold = self.alert_thresholds['error_rate']
+        
         for metric in metrics:
             # Anomaly alert
-            if metric.anomaly_score >= self.alert_thresholds['anomaly_score']:
+            if metric.anomaly_score >= anomaly_threshold:
                 alerts.append({
                     'type': 'anomaly',
                     'site': metric.site_name,
@@ -232,7 +573,7 @@ class AlertManager:
                 })
                 
             # High utilization alert
-            if metric.utilization >= self.alert_thresholds['utilization']:
+            if metric.utilization >= utilization_threshold:
                 alerts.append({
                     'type': 'utilization',
                     'site': metric.site_name,
@@ -243,7 +584,7 @@ class AlertManager:
                 })
                 
             # Error count alert
-            if metric.error_count >= self.alert_thresholds['error_rate']:
+            if metric.error_count >= error_threshold:
                 alerts.append({
                     'type': 'errors',
                     'site': metric.site_name,
@@ -253,39 +594,107 @@ class AlertManager:
                     'value': metric.error_count
                 })
                 
-        # Store recent alerts
-        self.recent_alerts.extend(alerts)
-        
-        # Keep only recent alerts (last hour)
+        # Store recent alerts, appending in place when they arrive in time order
+        by_time = itemgetter('timestamp')
+        new_alerts = sorted(alerts, key=by_time)
         cutoff_time = int(time.time()) - 3600
-        self.recent_alerts = [
-            alert for alert in self.recent_alerts 
-            if alert['timestamp'] >= cutoff_time
-        ]
-        
+        with self._lock:
+            if not self.recent_alerts or not new_alerts or by_time(new_alerts[0]) >= by_time(self.recent_alerts[-1]):
+                self.recent_alerts.extend(new_alerts)
+            else:
+                self.recent_alerts = deque(heapq.merge(self.recent_alerts, new_alerts, key=by_time))
+                
+            # Keep only recent alerts (last hour), evicting from the old end
+            while self.recent_alerts and self.recent_alerts[0]['timestamp'] < cutoff_time:
+                self.recent_alerts.popleft()
+                
         return alerts
         
     def get_recent_alerts(self, hours: int = 1) -> List[Dict]:
         """Get recent alerts"""
         cutoff_time = int(time.time()) - (hours * 3600)
-        return [
-            alert for alert in self.recent_alerts 
-            if alert['timestamp'] >= cutoff_time
-        ]
+        # Walk back from the newest end only as far as the cutoff
+        with self._lock:
+            alerts = list(takewhile(
+                lambda alert: alert['timestamp'] >= cutoff_time,
+                reversed(self.recent_alerts)
+            ))
+        alerts.reverse()
+        return alerts
+
+def writer_worker(db_manager, pending, response_cache):
+    """Background worker committing queued ingest records in batches, until a None arrives"""
+    stopping = False
+    while True:
+        batches = []  # one list of records per request
+        queued = 0
+        deadline = None
+        
+        # Gather whatever arrives within the flush interval into the same commit
+        while queued < WRITE_BATCH_SIZE:
+            try:
+                if stopping:
+                    records = pending.get_nowait()  # drain what's left
+                elif deadline is None:
+                    records = pending.get()  # block until there's work
+                    deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+                else:
+                    records = pending.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if records is None:
+                stopping = True
+                continue
+            batches.append(records)
+            queued += len(records)
+            
+        if not batches:
+            return  # stopping with an empty queue
+            
+        try:
+            db_manager.insert_metrics([record for records in batches for record in records])
+        except Exception as e:
+            logger.error(f"Writer worker error, retrying requests one by one: {e}")
+            # Commit each request on its own so one bad request can't sink the others
+            for records in batches:
+                try:
+                    db_manager.insert_metrics(records)
+                except Exception as e:
+                    logger.error(f"Dropped {len(records)} queued records: {e}")
+                    
+        # New rows: cached GET responses are stale
+        response_cache.invalidate()
+        
+def stop_writer(pending, writer_thread):
+    """Commit everything still queued and stop the writer (runs at interpreter exit)"""
+    if writer_thread.is_alive():
+        pending.put(None)  # blocks only while the writer frees a slot
+        writer_thread.join(WRITER_SHUTDOWN_TIMEOUT)
 
 def create_app():
     """Create Flask application"""
     app = Flask(__name__)
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = DASHBOARD_MAX_AGE  # static dashboard assets
     CORS(app)  # Enable CORS for dashboard
+    Compress(app)  # gzip/brotli JSON for clients that accept it
     
     # Initialize components
     db_manager = DatabaseManager()
     alert_manager = AlertManager()
+    response_cache = ResponseCache()
+    
+    # Ingest requests are queued whole and committed by a single writer
+    pending = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    writer_thread = threading.Thread(target=writer_worker, args=(db_manager, pending, response_cache))
+    writer_thread.daemon = True
+    writer_thread.start()
+    # Requests were answered 202 before their commit, so flush on worker exit
+    atexit.register(stop_writer, pending, writer_thread)
     
     @app.route('/api/health')
     def health_check():
         """Health check endpoint"""
-        return jsonify({
+        return _json({
             'status': 'healthy',
             'timestamp': int(time.time()),
             'version': '1.0.0'
@@ -297,234 +706,165 @@ def create_app():
         try:
             data = request.get_json()
             
-            if not data or 'sites' not in data:
-                return jsonify({'error': 'Invalid data format'}), 400
+            if not isinstance(data, dict) or not isinstance(data.get('sites'), list):
+                return _json({'error': 'Invalid data format'}), 400
                 
-            # Convert to metric records
-            records = []
-            for site_data in data['sites']:
-                record = MetricRecord(
-                    timestamp=site_data.get('timestamp', int(time.time())),
-                    site_name=site_data.get('site_name', ''),
-                    throughput_gbps=site_data.get('throughput_gbps', 0),
-                    error_count=site_data.get('error_count', 0),
-                    ber_errors=site_data.get('ber_errors', 0),
-                    link_status=site_data.get('link_status', 1),
-                    utilization=site_data.get('utilization', 0.0),
-                    anomaly_score=site_data.get('anomaly_score', 0.0),
-                    forecast_gbps=site_data.get('forecast_gbps', 0)
-                )
-                records.append(record)
+            if len(data['sites']) > INGEST_MAX_RECORDS:
+                return _json({'error': f'At most {INGEST_MAX_RECORDS} sites per request'}), 413
                 
-            # Store in database
-            db_manager.insert_metrics(records)
-            
+            # Convert to metric records, validated here since the write happens
+            # after this request has already been answered
+            try:
+                records = [_parse_metric(site_data) for site_data in data['sites']]
+            except ValueError as e:
+                return _json({'error': f'Invalid metric: {e}'}), 400
+                
+            # Hand off to the writer; the commit happens within WRITE_FLUSH_INTERVAL
+            if records:
+                try:
+                    pending.put_nowait(records)
+                except queue.Full:
+                    return _json({'error': 'Ingest queue full, retry later'}), 503
+                    
             # Check for alerts
             alerts = alert_manager.check_alerts(records)
             
+            # New alerts: cached GET responses are stale
+            response_cache.invalidate()
+            
             # Log alerts
             for alert in alerts:
                 logger.warning(f"ALERT: {alert['message']}")
                 
-            return jsonify({
-                'status': 'success',
+            return _json({
+                'status': 'accepted',
                 'records_processed': len(records),
                 'alerts_generated': len(alerts)
-            })
+            }), 202
             
         except Exception as e:
             logger.error(f"Error ingesting metrics: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/api/metrics')
+    @response_cache.cached
     def get_metrics():
         """Get latest metrics"""
         try:
             limit = request.args.get('limit', 100, type=int)
             records = db_manager.get_latest_metrics(limit)
             
-            return jsonify({
+            return _json({
                 'timestamp': int(time.time()),
-                'metrics': [asdict(record) for record in records]
+                'metrics': records
             })
             
         except Exception as e:
             logger.error(f"Error retrieving metrics: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/api/sites/<site_name>/metrics')
+    @response_cache.cached
     def get_site_metrics(site_name):
         """Get metrics for a specific site"""
         try:
             hours = request.args.get('hours', 24, type=int)
-            records = db_manager.get_site_metrics(site_name, hours)
-            
-            return jsonify({
+            # Clamped: 0 would end paging early and a negative LIMIT means no limit
+            limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), PAGE_SIZE)
+            before = request.args.get('before', type=int)
+            before_id = request.args.get('before_id', type=int)
+            
+            # Long windows come from the hourly rollup unless ?resolution=raw
+            resolution = request.args.get('resolution', 'hourly' if hours >= ROLLUP_MIN_HOURS else 'raw')
+            if resolution == 'hourly':
+                records = db_manager.get_site_rollup(site_name, hours, limit, before)
+            elif resolution == 'raw':
+                records = db_manager.get_site_metrics(site_name, hours, limit, before, before_id)
+            else:
+                return _json({'error': 'resolution must be raw or hourly'}), 400
+                
+            return _json({
                 'site': site_name,
                 'hours': hours,
-                'metrics': [asdict(record) for record in records]
+                'resolution': resolution,
+                'metrics': records,
+                # Pass back as ?before=&before_id= for the next (older) page
+                'next_before': records[-1].timestamp if len(records) == limit else None,
+                'next_before_id': records[-1].id if resolution == 'raw' and len(records) == limit else None
             })
             
         except Exception as e:
             logger.error(f"Error retrieving site metrics: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/api/anomalies')
+    @response_cache.cached
     def get_anomalies():
         """Get anomalous metrics"""
         try:
             threshold = request.args.get('threshold', 0.8, type=float)
             hours = request.args.get('hours', 24, type=int)
+            limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), PAGE_SIZE)
+            offset = max(request.args.get('offset', 0, type=int), 0)
             
-            records = db_manager.get_anomalies(threshold, hours)
+            records = db_manager.get_anomalies(threshold, hours, limit, offset)
             
-            return jsonify({
+            return _json({
                 'threshold': threshold,
                 'hours': hours,
-                'anomalies': [asdict(record) for record in records]
+                'anomalies': records,
+                'next_offset': offset + limit if len(records) == limit else None
             })
             
         except Exception as e:
             logger.error(f"Error retrieving anomalies: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/api/alerts')
+    @response_cache.cached
     def get_alerts():
         """Get recent alerts"""
         try:
             hours = request.args.get('hours', 1, type=int)
             alerts = alert_manager.get_recent_alerts(hours)
             
-            return jsonify({
+            return _json({
                 'hours': hours,
                 'alerts': alerts
             })
             
         except Exception as e:
             logger.error(f"Error retrieving alerts: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/api/sites')
+    @response_cache.cached
     def get_sites():
         """Get list of monitored sites"""
         try:
-            # Get distinct site names from recent data
-            with db_manager.get_connection() as conn:
-                cursor = conn.execute("""
-                    SELECT DISTINCT site_name, 
-                           MAX(timestamp) as last_seen,
-                           COUNT(*) as record_count
-                    FROM metrics 
-                    WHERE timestamp >= ?
-                    GROUP BY site_name
-                    ORDER BY last_seen DESC
-                """, (int(time.time()) - 86400,))  # Last 24 hours
-                
-                sites = []
-                for row in cursor.fetchall():
-                    sites.append({
-                        'name': row['site_name'],
-                        'last_seen': row['last_seen'],
-                        'record_count': row['record_count']
-                    })
-                    
-            return jsonify({
+            # Sites seen in the last 24 hours, from the ingest-maintained summary
+            sites = [
+                {
+                    'name': row['site_name'],
+                    'last_seen': row['last_seen'],
+                    'record_count': row['record_count']
+                }
+                for row in db_manager.get_sites(int(time.time()) - 86400)
+            ]
+            
+            return _json({
                 'sites': sites,
                 'count': len(sites)
             })
             
         except Exception as e:
             logger.error(f"Error retrieving sites: {e}")
-            return jsonify({'error': str(e)}), 500
+            return _json({'error': str(e)}), 500
             
     @app.route('/')
     def dashboard():
         """Serve dashboard page"""
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>SKMA-FON Dashboard</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                .header { background: #2c3e50; color: white; padding: 20px; margin-bottom: 20px; }
-                .metrics { display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }
-                .metric-card { border: 1px solid #ddd; padding: 15px; border-radius: 5px; }
-                .metric-value { font-size: 2em; font-weight: bold; color: #27ae60; }
-                .alert { background: #e74c3c; color: white; padding: 10px; margin: 5px 0; border-radius: 3px; }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>SKMA-FON Monitoring Dashboard</h1>
-                <p>Smart Kernel-Based Monitoring Agent for Fiber-Optimized Optical Networks</p>
-            </div>
-            
-            <div id="dashboard">
-                <p>Loading dashboard...</p>
-            </div>
-            
-            <script>
-                function loadDashboard() {
-                    fetch('/api/metrics?limit=20')
-                        .then(response => response.json())
-                        .then(data => {
-                            updateDashboard(data.metrics);
-                        })
-                        .catch(error => {
-                            document.getElementById('dashboard').innerHTML = 
-                                '<p style="color: red;">Error loading data: ' + error + '</p>';
-                        });
-                }
-                
-                function updateDashboard(metrics) {
-                    if (!metrics || metrics.length === 0) {
-                        document.getElementById('dashboard').innerHTML = 
-                            '<p>No metrics available. Make sure the monitoring agent is running.</p>';
-                        return;
-                    }
-                    
-                    // Group metrics by site
-                    const sites = {};
-                    metrics.forEach(metric => {
-                        if (!sites[metric.site_name]) {
-                            sites[metric.site_name] = [];
-                        }
-                        sites[metric.site_name].push(metric);
-                    });
-                    
-                    let html = '<div class="metrics">';
-                    
-                    Object.keys(sites).forEach(siteName => {
-                        const latestMetric = sites[siteName][0]; // Most recent
-                        const timestamp = new Date(latestMetric.timestamp * 1000).toLocaleString();
-                        
-                        html += `
-                            <div class="metric-card">
-                                <h3>${siteName}</h3>
-                                <div class="metric-value">${latestMetric.throughput_gbps} Gbps</div>
-                                <p>Utilization: ${latestMetric.utilization.toFixed(1)}%</p>
-                                <p>Errors: ${latestMetric.error_count}</p>
-                                <p>Anomaly Score: ${latestMetric.anomaly_score.toFixed(3)}</p>
-                                <p>Forecast: ${latestMetric.forecast_gbps} Gbps</p>
-                                <small>Last updated: ${timestamp}</small>
-                                ${latestMetric.anomaly_score >= 0.8 ? '<div class="alert">ANOMALY DETECTED!</div>' : ''}
-                                ${latestMetric.utilization >= 90 ? '<div class="alert">HIGH UTILIZATION!</div>' : ''}
-                            </div>
-                        `;
-                    });
-                    
-                    html += '</div>';
-                    document.getElementById('dashboard').innerHTML = html;
-                }
-                
-                // Load dashboard initially and refresh every 5 seconds
-                loadDashboard();
-                setInterval(loadDashboard, 5000);
-            </script>
-        </body>
-        </html>
-        """
+        return app.send_static_file('index.html')
         
     return app
 
@@ -537,16 +877,20 @@ def cleanup_worker(db_manager):
         except Exception as e:
             logger.error(f"Cleanup worker error: {e}")
 
-def main():
-    """Main entry point"""
-    app = create_app()
-    
-    # Start cleanup worker
+def start_cleanup_worker():
+    """Start the background cleanup worker"""
     db_manager = DatabaseManager()
     cleanup_thread = threading.Thread(target=cleanup_worker, args=(db_manager,))
     cleanup_thread.daemon = True
     cleanup_thread.start()
     
+def main():
+    """Development entry point (production runs wsgi:app under gunicorn)"""
+    app = create_app()
+    
+    # Start cleanup worker
+    start_cleanup_worker()
+    
     logger.info(f"Starting SKMA-FON Cloud API on port {API_PORT}")
     app.run(host='0.0.0.0', port=API_PORT, debug=False)
 
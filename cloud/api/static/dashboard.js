@@ -0,0 +1,56 @@
+function loadDashboard() {
+    fetch('/api/metrics?limit=20')
+        .then(response => response.json())
+        .then(data => {
+            updateDashboard(data.metrics);
+        })
+        .catch(error => {
+            document.getElementById('dashboard').innerHTML = 
+                '<p style="color: red;">Error loading data: ' + error + '</p>';
+        });
+}
+
+function updateDashboard(metrics) {
+    if (!metrics || metrics.length === 0) {
+        document.getElementById('dashboard').innerHTML = 
+            '<p>No metrics available. Make sure the monitoring agent is running.</p>';
+        return;
+    }
+
+    // Group metrics by site
+    const sites = {};
+    metrics.forEach(metric => {
+        if (!sites[metric.site_name]) {
+            sites[metric.site_name] = [];
+        }
+        sites[metric.site_name].push(metric);
+    });
+
+    let html = '<div class="metrics">';
+
+    Object.keys(sites).forEach(siteName => {
+        const latestMetric = sites[siteName][0]; // Most recent
+        const timestamp = new Date(latestMetric.timestamp * 1000).toLocaleString();
+
+        html += `
+            <div class="metric-card">
+                <h3>${siteName}</h3>
+                <div class="metric-value">${latestMetric.throughput_gbps} Gbps</div>
+                <p>Utilization: ${latestMetric.utilization.toFixed(1)}%</p>
+                <p>Errors: ${latestMetric.error_count}</p>
+                <p>Anomaly Score: ${latestMetric.anomaly_score.toFixed(3)}</p>
+                <p>Forecast: ${latestMetric.forecast_gbps} Gbps</p>
+                <small>Last updated: ${timestamp}</small>
+                ${latestMetric.anomaly_score >= 0.8 ? '<div class="alert">ANOMALY DETECTED!</div>' : ''}
+                ${latestMetric.utilization >= 90 ? '<div class="alert">HIGH UTILIZATION!</div>' : ''}
+            </div>
+        `;
+    });
+
+    html += '</div>';
+    document.getElementById('dashboard').innerHTML = html;
+}
+
+// Load dashboard initially and refresh every 5 seconds
+loadDashboard();
+setInterval(loadDashboard, 5000);
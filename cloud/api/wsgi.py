@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+SKMA-FON Cloud API WSGI entry point
+
+Run with: gunicorn -k gthread -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Author: Soufian Carson
+License: MIT
+"""
+
+from app import create_app, start_cleanup_worker
+
+app = create_app()
+
+# Response cache, alert history and cleanup are per process, so keep to one worker
+start_cleanup_worker()